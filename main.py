@@ -5,11 +5,19 @@ from pydantic import BaseModel
 import os
 import tempfile
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import json
 import re
 import warnings
 import base64
+import concurrent.futures
+import difflib
+import hashlib
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
 from PIL import Image
 import io
 from dotenv import load_dotenv
@@ -44,6 +52,8 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+logger = logging.getLogger(__name__)
+
 # Configuration from environment variables
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
@@ -162,6 +172,89 @@ Now, analyze the provided medical document image and return only the JSON object
 
 """
 
+# Homeopathic remedy abbreviations as written in the Prescriptions column
+REMEDY_ABBREVIATIONS = {
+    "arn": "Arnica Montana",
+    "bry": "Bryonia Alba",
+    "aco": "Aconitum Napellus",
+    "ruta": "Ruta Graveolens",
+    "phyto": "Phytolacca",
+    "sulfo": "Sulphur",
+    "sul": "Sulphur",
+    "fp": "Ferrum Phosphoricum",
+    "nm": "Natrum Muriaticum",
+    "chame": "Chamomilla",
+    "thy": "Thyroidinum",
+    "lssl": "Lycopodium",
+    "cp": "Carcinosin",
+    "mp": "Magnesia Phosphorica",
+    "np": "Natrum Phosphoricum",
+    "kp": "Kali Phosphoricum",
+    "sl": "Sac Lac",
+    "nux": "Nux Vomica",
+    "apis": "Apis Mellifica",
+    "cf": "Calcarea Fluorica",
+}
+
+# Separates prescription visits within the Prescriptions column
+VISIT_SEPARATOR = "|--|"
+
+def split_visits(prescriptions: str) -> List[str]:
+    """Split a Prescriptions value into its non-empty, stripped visits"""
+    return [visit.strip() for visit in (prescriptions or "").split(VISIT_SEPARATOR) if visit.strip()]
+
+# Static parts of the patient analysis prompt, prepared once per process
+PATIENT_ANALYSIS_PREAMBLE = """
+        🏥 HOMEOPATHIC MEDICAL ANALYSIS
+
+        📋 PRESCRIPTION UNDERSTANDING:
+        - "|--|" separates different prescription visits/dates
+        - Common homeopathic abbreviations: 
+          * arn=Arnica Montana, bry=Bryonia Alba, aco=Aconitum Napellus
+          * ruta=Ruta Graveolens, phyto=Phytolacca, sulfo/sul=Sulphur
+          * fp=Ferrum Phosphoricum, nm=Natrum Muriaticum, chame=Chamomilla
+          * thy=Thyroidinum, lssl=Lycopodium, cp=Carcinosin, mp=Magnesia Phosphorica
+          * np=Natrum Phosphoricum, kp=Kali Phosphoricum, sl=Sac Lac
+          * nux=Nux Vomica, apis=Apis Mellifica, cf=Calcarea Fluorica
+        - Potencies: 30, 200c, 6x, 1M indicate medicine strength/dilution levels
+        - bid=twice daily, tid=three times daily, hd=high dilution
+
+        🔍 MEDICINE-CONDITION MAPPING:
+        - arn (Arnica) → trauma, bruises, muscle soreness, post-surgical healing
+        - bry (Bryonia) → dry cough, headaches, joint pain, respiratory issues
+        - thy (Thyroidinum) → thyroid disorders, metabolism issues
+        - lssl (Lycopodium) → digestive issues, liver problems, bloating
+        - cp (Carcinosin) → constitutional remedy for chronic conditions
+        - mp (Magnesia Phos) → muscle cramps, neuralgic pain, spasms
+        - nux (Nux Vomica) → digestive disorders, constipation, stress
+        - sul (Sulphur) → skin conditions, chronic diseases, constitutional remedy
+"""
+
+PATIENT_ANALYSIS_INSTRUCTIONS = """
+        📊 PROVIDE COMPREHENSIVE ANALYSIS:
+        1. What homeopathic medicines were prescribed to this patient?
+        2. What medical conditions do these medicines suggest?
+        3. What is the treatment timeline and progression?
+        4. Based on the query, what specific insights can you provide?
+        5. What recommendations would you make for similar cases?
+        6. Are there any patterns in the prescription history?
+
+        Keep the analysis practical and focused on medical insights that would help a homeopathic practitioner understand this patient's case.
+"""
+
+CASE_SUMMARY_INSTRUCTIONS = """
+        📝 CASE SUMMARY TASK:
+        Condense the prescription visits below into a concise case summary (at most 200 words) for a homeopathic practitioner.
+        Keep every remedy with its potency and dosage, the complaints/conditions mentioned, visit dates and how the treatment changed over time.
+        If an existing summary is given, update it with the new visits instead of repeating it.
+        Return only the summary text.
+"""
+
+# Number of most recent visits always sent verbatim; earlier visits may be sent as a cached summary
+CASE_SUMMARY_RECENT_VISITS = int(os.getenv("CASE_SUMMARY_RECENT_VISITS", "3"))
+# Earlier visits are only (re)summarized once their un-summarized text reaches this many characters
+CASE_SUMMARY_MIN_CHARACTERS = int(os.getenv("CASE_SUMMARY_MIN_CHARACTERS", "1500"))
+
 def save_temp_image(file_content: bytes, filename: str) -> str:
     """Save image to temporary file and return the path"""
     try:
@@ -268,13 +361,128 @@ def get_patient_by_pid(pid: int) -> Optional[Dict[str, Any]]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving patient data: {str(e)}")
 
+def generate_text_with_ai(prompt: str) -> str:
+    """Run a single prompt through BigFrames GeminiTextGenerator and return the text"""
+    gemini = GeminiTextGenerator()
+    prompt_df = bpd.DataFrame({"prompt": [prompt]})
+    response = gemini.predict(prompt_df)
+    return response.to_pandas().iloc[0, 0]
+
+class PatientSummaryStore:
+    """
+    Per-patient cache of condensed prescription histories
+
+    Visits before the most recent CASE_SUMMARY_RECENT_VISITS are summarized in a
+    background worker once their un-summarized text reaches CASE_SUMMARY_MIN_CHARACTERS,
+    so short histories are always sent verbatim and queries never wait on a summary.
+    Each entry records how many visits it covers and a hash of their content, so
+    appended visits are folded into the existing summary while edits to earlier
+    visits invalidate it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries: Dict[int, Dict[str, Any]] = {}
+        self._pending = set()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="case-summary")
+
+    @staticmethod
+    def _hash_visits(visits: List[str]) -> str:
+        return hashlib.sha256(VISIT_SEPARATOR.join(visits).encode("utf-8")).hexdigest()
+
+    def get_case_history(self, pid: int, prescriptions: str) -> Dict[str, Any]:
+        """
+        Split a patient's prescriptions into the cached summary and the visits it does not cover
+
+        Schedules a background summary update when enough un-summarized earlier visits
+        have accumulated; the current call uses whatever summary is already valid.
+
+        Returns dict with:
+        - summary: Condensed earlier visits (empty when none is cached yet)
+        - summarized_visits: Number of visits covered by the summary
+        - latest_visits: All visits after the summarized ones, verbatim
+        """
+        visits = split_visits(prescriptions)
+        earlier = visits[:-CASE_SUMMARY_RECENT_VISITS] if CASE_SUMMARY_RECENT_VISITS > 0 else visits
+
+        with self._lock:
+            cached = self._summaries.get(pid)
+
+        if cached and cached["visit_count"] <= len(earlier) and cached["hash"] == self._hash_visits(earlier[:cached["visit_count"]]):
+            summary, covered = cached["summary"], cached["visit_count"]
+        else:
+            summary, covered = "", 0
+
+        if len(VISIT_SEPARATOR.join(earlier[covered:])) >= CASE_SUMMARY_MIN_CHARACTERS:
+            self._schedule_update(pid, summary, covered, earlier)
+
+        return {"summary": summary, "summarized_visits": covered, "latest_visits": visits[covered:]}
+
+    def _schedule_update(self, pid: int, summary: str, covered: int, earlier: List[str]):
+        """Fold earlier[covered:] into the summary in the background, once per patient at a time"""
+        with self._lock:
+            if pid in self._pending:
+                return
+            self._pending.add(pid)
+
+        self._executor.submit(self._update, pid, summary, covered, earlier)
+
+    def _update(self, pid: int, summary: str, covered: int, earlier: List[str]):
+        try:
+            updated = self._summarize(summary, earlier[covered:])
+            if not updated or not updated.strip():
+                logger.warning("Empty case summary returned for PID %s; not caching it", pid)
+                return
+
+            with self._lock:
+                self._summaries[pid] = {
+                    "hash": self._hash_visits(earlier),
+                    "visit_count": len(earlier),
+                    "summary": updated.strip(),
+                }
+
+        except Exception:
+            logger.exception("Case summary update failed for PID %s", pid)
+        finally:
+            with self._lock:
+                self._pending.discard(pid)
+
+    def _summarize(self, existing_summary: str, visits: List[str]) -> str:
+        """Ask the model to fold new visits into an existing summary (or start a new one)"""
+        new_visits = f" {VISIT_SEPARATOR} ".join(visits)
+        summary_prompt = f"""
+        {PATIENT_ANALYSIS_PREAMBLE}
+        {CASE_SUMMARY_INSTRUCTIONS}
+        Existing summary: {existing_summary or "None"}
+
+        New visits: {new_visits}
+        """
+        return generate_text_with_ai(summary_prompt)
+
+patient_summaries = PatientSummaryStore()
+
 def analyze_patient_with_ai(patient_data: Dict[str, Any], query: str) -> str:
     """Perform AI analysis on patient data based on the query using BigFrames GeminiTextGenerator"""
     try:
+        # Earlier visits come from the per-patient summary cache; fall back to the full history
+        try:
+            case_history = patient_summaries.get_case_history(patient_data['pid'], patient_data['prescriptions'])
+        except Exception:
+            logger.exception("Case summary lookup failed for PID %s; sending full history", patient_data['pid'])
+            case_history = None
+
+        if case_history and case_history["summary"]:
+            latest_prescriptions = f" {VISIT_SEPARATOR} ".join(case_history["latest_visits"])
+            prescription_details = (
+                f"- Case Summary of Earlier Visits ({case_history['summarized_visits']} visits): {case_history['summary']}\n"
+                f"        - Latest Prescriptions: {latest_prescriptions}"
+            )
+        else:
+            prescription_details = f"- Full Prescriptions: {patient_data['prescriptions']}"
+
         # Enhanced analysis prompt with homeopathic medicine knowledge
         analysis_prompt = f"""
-        🏥 HOMEOPATHIC MEDICAL ANALYSIS
-
+        {PATIENT_ANALYSIS_PREAMBLE}
         Medical Query: "{query}"
         
         📋 PATIENT INFORMATION:
@@ -283,145 +491,523 @@ def analyze_patient_with_ai(patient_data: Dict[str, Any], query: str) -> str:
         - Age: {patient_data['age']}, Gender: {patient_data['gender']}
         - Address: {patient_data['address']}
         - First Visit: {patient_data['first_visit']}
-        - Full Prescriptions: {patient_data['prescriptions']}
-
-        📋 PRESCRIPTION UNDERSTANDING:
-        - "|--|" separates different prescription visits/dates
-        - Common homeopathic abbreviations: 
-          * arn=Arnica Montana, bry=Bryonia Alba, aco=Aconitum Napellus
-          * ruta=Ruta Graveolens, phyto=Phytolacca, sulfo/sul=Sulphur
-          * fp=Ferrum Phosphoricum, nm=Natrum Muriaticum, chame=Chamomilla
-          * thy=Thyroidinum, lssl=Lycopodium, cp=Carcinosin, mp=Magnesia Phosphorica
-          * np=Natrum Phosphoricum, kp=Kali Phosphoricum, sl=Sac Lac
-          * nux=Nux Vomica, apis=Apis Mellifica, cf=Calcarea Fluorica
-        - Potencies: 30, 200c, 6x, 1M indicate medicine strength/dilution levels
-        - bid=twice daily, tid=three times daily, hd=high dilution
-
-        🔍 MEDICINE-CONDITION MAPPING:
-        - arn (Arnica) → trauma, bruises, muscle soreness, post-surgical healing
-        - bry (Bryonia) → dry cough, headaches, joint pain, respiratory issues
-        - thy (Thyroidinum) → thyroid disorders, metabolism issues
-        - lssl (Lycopodium) → digestive issues, liver problems, bloating
-        - cp (Carcinosin) → constitutional remedy for chronic conditions
-        - mp (Magnesia Phos) → muscle cramps, neuralgic pain, spasms
-        - nux (Nux Vomica) → digestive disorders, constipation, stress
-        - sul (Sulphur) → skin conditions, chronic diseases, constitutional remedy
-
-        📊 PROVIDE COMPREHENSIVE ANALYSIS:
-        1. What homeopathic medicines were prescribed to this patient?
-        2. What medical conditions do these medicines suggest?
-        3. What is the treatment timeline and progression?
-        4. Based on the query, what specific insights can you provide?
-        5. What recommendations would you make for similar cases?
-        6. Are there any patterns in the prescription history?
-
-        Keep the analysis practical and focused on medical insights that would help a homeopathic practitioner understand this patient's case.
+        {prescription_details}
+        {PATIENT_ANALYSIS_INSTRUCTIONS}
         """
 
         # Use BigFrames GeminiTextGenerator
-        gemini = GeminiTextGenerator()
-        prompt_df = bpd.DataFrame({"prompt": [analysis_prompt]})
-        response = gemini.predict(prompt_df)
-        analysis = response.to_pandas().iloc[0, 0]
-        return analysis
+        return generate_text_with_ai(analysis_prompt)
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in AI analysis: {str(e)}")
 
 def vector_search_patients(question: str, top_k: int = 5) -> Optional[Dict[str, Any]]:
     """
-    Perform vector search on patient data using BigFrames
+    Search patient data using the cheapest strategy that answers the query
     Based on the ask_question function from the notebook
+
+    PID queries are answered directly, names and remedy/potency terms are matched
+    against the cached patient snapshot, and only free-text queries pay for an
+    embedding and BigQuery vector search. When several strategies apply their
+    scores are fused, and the chosen plan is reported in search_type. The
+    snapshot is only used for ranking; returned rows are read from BigQuery.
     """
     try:
         # Check if this is a PID query
-        import re
         pid_match = re.search(r'(?:pid|patient)\s*(\d+)', question.lower())
-        
+
         if pid_match:
             # Direct PID lookup from the embeddings table
             pid_number = int(pid_match.group(1))
-            
-            # Read from embeddings table and filter by PID
-            df_written = bpd.read_gbq(EMBEDDING_TABLE_ID)
-            results = df_written[df_written["PID"] == pid_number]
-            
-            if len(results) == 0:
+            patient_data = get_patient_by_pid(pid_number)
+
+            if patient_data is None:
                 return {
                     "search_type": "pid_lookup",
                     "query": question,
                     "results": [],
                     "message": f"No patient found with PID {pid_number}"
                 }
-            
-            # Convert to pandas for processing
-            results_pd = results.to_pandas()
-            patient = results_pd.iloc[0]
-            
+
+            patient_data.pop("patient_description", None)
+            patient_data["similarity"] = 100.0  # Exact match
             return {
                 "search_type": "pid_lookup",
                 "query": question,
-                "results": [{
-                    "pid": int(patient['PID']),
-                    "first_name": patient['FirstName'],
-                    "last_name": patient['LastName'],
-                    "age": int(patient['Age']),
-                    "gender": patient['Gender'],
-                    "address": patient['Address'],
-                    "first_visit": patient['FirstVisit'],
-                    "prescriptions": patient['Prescriptions'],
-                    "similarity": 100.0  # Exact match
-                }],
+                "results": [patient_data],
                 "total_results": 1
             }
-        
-        else:
-            # Semantic vector search using bigframes.bigquery.vector_search
-            # Generate embedding for the search string
-            text_model = TextEmbeddingGenerator(model_name="text-multilingual-embedding-002")
-            search_df = bpd.DataFrame([question], columns=['search_string'])
-            search_embedding = text_model.predict(search_df)
-            
-            # Perform vector search using bigframes
-            vector_search_results = bbq.vector_search(
-                base_table=EMBEDDING_TABLE_ID,
-                column_to_search="ml_generate_embedding_result",
-                query=search_embedding,
-                distance_type="COSINE",
-                query_column_to_search="ml_generate_embedding_result",
-                top_k=top_k,
-            )
-            
-            # Get results and convert to pandas for processing
-            results = vector_search_results[["PID", "FirstName", "LastName", "Age", "Gender", "Address", "Prescriptions", "distance"]].sort_values("distance")
-            results_pd = results.to_pandas()
-            
-            # Format results
-            formatted_results = []
-            for _, row in results_pd.iterrows():
-                similarity_percent = round((1 - row['distance']) * 100, 1)
-                formatted_results.append({
-                    "pid": int(row['PID']),
-                    "first_name": row['FirstName'],
-                    "last_name": row['LastName'],
-                    "age": int(row['Age']),
-                    "gender": row['Gender'],
-                    "address": row['Address'],
-                    "prescriptions": row['Prescriptions'],
-                    "similarity": similarity_percent,
-                    "distance": float(row['distance'])
-                })
-            
-            return {
-                "search_type": "vector_search",
-                "query": question,
-                "results": formatted_results,
-                "total_results": len(formatted_results)
-            }
-            
+
+        search_index = get_patient_search_index()
+        plan = plan_patient_query(question, search_index)
+
+        strategies = plan["strategies"]
+        scores: Dict[str, pd.Series] = {}
+        if "name_match" in strategies:
+            scores["name_match"] = score_name_match(search_index, plan["name_terms"])
+        if "remedy_match" in strategies:
+            scores["remedy_match"] = score_remedy_match(search_index, plan["remedy_terms"])
+
+        # Fall back to semantic search alone when the lexical strategies find nothing
+        if scores and not any((score > 0).any() for score in scores.values()) and "vector_search" not in strategies:
+            strategies = ["vector_search"]
+            scores = {}
+
+        distances = None
+        if "vector_search" in strategies:
+            distances = semantic_search_distances(question, top_k)
+            scores["vector_search"] = (1 - distances).clip(lower=0, upper=1)
+
+        # Weighted mean of the per-strategy scores; a patient missing from a strategy scores 0 there
+        weights = pd.Series({name: SEARCH_STRATEGY_WEIGHTS[name] for name in scores})
+        fused = pd.concat(scores, axis=1).fillna(0).mul(weights).sum(axis=1) / weights.sum()
+        fused = fused[fused > 0].sort_values(ascending=False, kind="stable").head(top_k)
+
+        # The snapshot only ranks patients; the returned rows are read fresh from BigQuery
+        patients = load_patient_snapshot(fused.index.tolist()) if len(fused) else None
+
+        # Format results
+        formatted_results = []
+        for pid, score in fused.items():
+            if pid not in patients.index:
+                continue  # Deleted since the snapshot was loaded
+            result = format_search_result(pid, patients.loc[pid], round(float(score) * 100, 1))
+            if distances is not None and pid in distances.index:
+                result["distance"] = float(distances.loc[pid])
+            formatted_results.append(result)
+
+        return {
+            "search_type": "+".join(strategies),
+            "query": question,
+            "query_plan": {
+                "name_terms": plan["name_terms"],
+                "remedy_terms": plan["remedy_terms"],
+                "free_text": plan["free_text"],
+            },
+            "results": formatted_results,
+            "total_results": len(formatted_results)
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Vector search error: {str(e)}")
 
+# Remedy token optionally followed by its potency (e.g. "arn 30", "mp 6x", "cp 200c", "sul 1m")
+REMEDY_POTENCY_PATTERN = (
+    r"(?<![a-z])(" + "|".join(sorted(REMEDY_ABBREVIATIONS, key=len, reverse=True)) + r")(?![a-z])"
+    r"(?:\s*(\d+[xcm]?)(?![\w/:.]))?"
+)
+FIRST_VISIT_FORMAT = "%m/%d/%y %H:%M:%S"
+AGE_BAND_BINS = [0, 12, 18, 30, 45, 60, np.inf]
+AGE_BAND_LABELS = ["0-12", "13-18", "19-30", "31-45", "46-60", "60+"]
+PATIENT_SNAPSHOT_COLUMNS = ["PID", "FirstName", "LastName", "Age", "Gender", "Address", "FirstVisit", "Prescriptions"]
+# Per-row fingerprint computed in BigQuery so refreshes only download rows that changed
+PATIENT_ROW_HASH_SQL = f"FARM_FINGERPRINT(TO_JSON_STRING(STRUCT({', '.join(PATIENT_SNAPSHOT_COLUMNS[1:])}))) AS row_hash"
+# Seconds before a read of the patient snapshot triggers a background refresh
+PATIENT_SNAPSHOT_TTL_SECONDS = int(os.getenv("PATIENT_SNAPSHOT_TTL_SECONDS", "300"))
+# Above this many changed rows (or this fraction of the table) a refresh reloads the whole
+# table instead of listing every changed PID in one query
+PATIENT_SNAPSHOT_MAX_INCREMENTAL_ROWS = 1000
+PATIENT_SNAPSHOT_MAX_INCREMENTAL_FRACTION = 0.2
+
+def load_patient_snapshot(pids: Optional[List[int]] = None) -> pd.DataFrame:
+    """Read the patient table (without embedding columns) into pandas, indexed by PID, optionally limited to pids"""
+    where = f"WHERE PID IN ({', '.join(str(int(pid)) for pid in pids)})" if pids is not None else ""
+    query = f"""
+    SELECT {", ".join(PATIENT_SNAPSHOT_COLUMNS)}, {PATIENT_ROW_HASH_SQL}
+    FROM `{EMBEDDING_TABLE_ID}`
+    {where}
+    """
+    snapshot = bpd.read_gbq_query(query).to_pandas()
+    return snapshot.set_index("PID").sort_index()
+
+def load_patient_row_hashes() -> pd.Series:
+    """Read only the PID and row fingerprint of every patient, indexed by PID"""
+    query = f"""
+    SELECT PID, {PATIENT_ROW_HASH_SQL}
+    FROM `{EMBEDDING_TABLE_ID}`
+    """
+    return bpd.read_gbq_query(query).to_pandas().set_index("PID")["row_hash"]
+
+def extract_patient_facts(patients: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Derive per-patient analytics facts with vectorized pandas operations
+
+    Returns:
+    - demographics: one row per PID with age band, gender, first visit month and visit count
+    - prescribed: one row per remedy mention with its potency (if written) and the patient's age band
+    """
+    prescriptions = patients["Prescriptions"].fillna("").astype(str)
+    first_visit = pd.to_datetime(patients["FirstVisit"], format=FIRST_VISIT_FORMAT, errors="coerce")
+    segments = prescriptions.str.split(VISIT_SEPARATOR, regex=False).explode()
+
+    demographics = pd.DataFrame({
+        "age_band": pd.cut(patients["Age"], bins=AGE_BAND_BINS, labels=AGE_BAND_LABELS, include_lowest=True)
+            .astype(str).replace("nan", "Unknown"),
+        "gender": patients["Gender"].fillna("Unknown").astype(str).str.upper(),
+        "first_visit_month": first_visit.dt.strftime("%Y-%m").fillna("Unknown"),
+        # Non-empty visits only, the same rule as split_visits
+        "visit_count": (segments.str.strip() != "").groupby(level=0).sum(),
+    }, index=patients.index)
+
+    prescribed = prescriptions.str.lower().str.extractall(REMEDY_POTENCY_PATTERN)
+    prescribed.columns = ["remedy", "potency"]
+    prescribed = prescribed.droplevel("match")
+    prescribed["remedy"] = prescribed["remedy"].map(REMEDY_ABBREVIATIONS)
+    prescribed["age_band"] = demographics["age_band"].reindex(prescribed.index).values
+
+    return {"demographics": demographics, "prescribed": prescribed}
+
+def aggregate_patient_facts(facts: Dict[str, pd.DataFrame]) -> Dict[str, pd.Series]:
+    """Group-by counts over patient facts; results are additive so they can be merged incrementally"""
+    demographics = facts["demographics"]
+    prescribed = facts["prescribed"]
+
+    return {
+        "totals": pd.Series({
+            "patients": len(demographics),
+            "visits": int(demographics["visit_count"].sum()),
+        }),
+        "gender_split": demographics.groupby("gender").size(),
+        "age_bands": demographics.groupby("age_band").size(),
+        "new_patients_per_month": demographics.groupby("first_visit_month").size(),
+        "remedy_frequency": prescribed.groupby("remedy").size(),
+        "remedy_by_age_band": prescribed.groupby(["age_band", "remedy"]).size(),
+        "potency_frequency": prescribed.dropna(subset=["potency"]).groupby("potency").size(),
+    }
+
+class PatientAnalyticsStore:
+    """
+    Materialized practice-level aggregates over the patient table
+
+    Each refresh compares the snapshot's row_hash column with the previous one and
+    only re-derives facts for patients that were added, modified or removed,
+    applying their contribution as a delta to the stored aggregates. Dashboard
+    reads return the materialized result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._row_hashes = pd.Series(dtype="uint64")
+        self._facts: Optional[Dict[str, pd.DataFrame]] = None
+        self._aggregates: Dict[str, pd.Series] = {}
+        self.materialized: Optional[Dict[str, Any]] = None
+        self.refreshed_at: Optional[datetime] = None
+
+    def refresh(self, snapshot: pd.DataFrame) -> Dict[str, int]:
+        """Apply the rows that changed since the previous snapshot and re-materialize the results"""
+        hashes = snapshot["row_hash"]
+
+        with self._lock:
+            previous = self._row_hashes
+            common = hashes.index.intersection(previous.index)
+            modified = common[hashes.loc[common].values != previous.loc[common].values]
+            added = hashes.index.difference(previous.index)
+            removed = previous.index.difference(hashes.index)
+
+            stale = modified.union(removed)
+            fresh = modified.union(added)
+
+            # Build the new facts and aggregates before touching any state, so a failure
+            # part-way leaves the store consistent with its previous row hashes
+            facts, aggregates = self._facts, self._aggregates
+            if facts is None:
+                facts = extract_patient_facts(snapshot)
+                aggregates = aggregate_patient_facts(facts)
+            elif len(stale) or len(fresh):
+                stale_facts = {name: frame[frame.index.isin(stale)] for name, frame in facts.items()}
+                fresh_facts = extract_patient_facts(snapshot.loc[fresh])
+                aggregates = self._merge(aggregates, aggregate_patient_facts(stale_facts), sign=-1)
+                aggregates = self._merge(aggregates, aggregate_patient_facts(fresh_facts), sign=1)
+                facts = {
+                    name: pd.concat([frame[~frame.index.isin(stale)], fresh_facts[name]])
+                    for name, frame in facts.items()
+                }
+
+            self._facts, self._aggregates, self._row_hashes = facts, aggregates, hashes
+            self.refreshed_at = datetime.now()
+            self.materialized = self._materialize()
+
+        return {"added": len(added), "modified": len(modified), "removed": len(removed)}
+
+    @staticmethod
+    def _merge(aggregates: Dict[str, pd.Series], delta: Dict[str, pd.Series], sign: int) -> Dict[str, pd.Series]:
+        """Return aggregates with a set of deltas added (sign=1) or subtracted (sign=-1)"""
+        merged_aggregates = {}
+        for name, counts in aggregates.items():
+            merged = counts.add(sign * delta[name], fill_value=0)
+            merged_aggregates[name] = merged[merged != 0].astype(int)
+        return merged_aggregates
+
+    def _materialize(self) -> Dict[str, Any]:
+        """Convert the stored aggregates into a JSON-ready response"""
+        aggregates = self._aggregates
+
+        def ranked(counts: pd.Series) -> Dict[str, int]:
+            return {str(key): int(value) for key, value in counts.sort_values(ascending=False).items()}
+
+        age_bands = aggregates["age_bands"].reindex(
+            AGE_BAND_LABELS + sorted(set(aggregates["age_bands"].index) - set(AGE_BAND_LABELS))
+        ).dropna()
+
+        remedy_by_age_band: Dict[str, Dict[str, int]] = {band: {} for band in age_bands.index}
+        for (band, remedy), count in aggregates["remedy_by_age_band"].sort_values(ascending=False).items():
+            remedy_by_age_band.setdefault(band, {})[remedy] = int(count)
+
+        return {
+            "refreshed_at": self.refreshed_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "total_patients": int(aggregates["totals"].get("patients", 0)),
+            "total_visits": int(aggregates["totals"].get("visits", 0)),
+            "gender_split": ranked(aggregates["gender_split"]),
+            "age_bands": {band: int(count) for band, count in age_bands.items()},
+            "new_patients_per_month": {
+                month: int(count) for month, count in aggregates["new_patients_per_month"].sort_index().items()
+            },
+            "remedy_frequency": ranked(aggregates["remedy_frequency"]),
+            "remedy_by_age_band": remedy_by_age_band,
+            "potency_frequency": ranked(aggregates["potency_frequency"]),
+        }
+
+patient_analytics = PatientAnalyticsStore()
+_patient_snapshot: Optional[pd.DataFrame] = None
+_patient_snapshot_loaded_at = 0.0
+_patient_search_index: Optional[Dict[str, Any]] = None
+_patient_snapshot_lock = threading.Lock()
+
+def _refresh_patient_snapshot_locked() -> Dict[str, int]:
+    """Download added/modified rows (by row fingerprint), rebuild the snapshot and update analytics"""
+    global _patient_snapshot, _patient_snapshot_loaded_at, _patient_search_index
+    previous = _patient_snapshot
+
+    if previous is None:
+        snapshot = load_patient_snapshot()
+    else:
+        hashes = load_patient_row_hashes()
+        common = hashes.index.intersection(previous.index)
+        modified = common[hashes.loc[common].values != previous.loc[common, "row_hash"].values]
+        changed = hashes.index.difference(previous.index).union(modified)
+
+        if len(changed) > min(PATIENT_SNAPSHOT_MAX_INCREMENTAL_ROWS, PATIENT_SNAPSHOT_MAX_INCREMENTAL_FRACTION * len(hashes)):
+            snapshot = load_patient_snapshot()
+        else:
+            snapshot = previous.loc[common.difference(changed)]
+            if len(changed):
+                snapshot = pd.concat([snapshot, load_patient_snapshot(changed.tolist())]).sort_index()
+
+    changes = patient_analytics.refresh(snapshot)
+    _patient_search_index = build_patient_search_index(snapshot)
+    _patient_snapshot = snapshot
+    _patient_snapshot_loaded_at = time.monotonic()
+    return changes
+
+def refresh_patient_snapshot() -> Dict[str, int]:
+    """Bring the patient snapshot up to date with BigQuery and apply changed rows to the analytics"""
+    try:
+        with _patient_snapshot_lock:
+            return _refresh_patient_snapshot_locked()
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading patient snapshot: {str(e)}")
+
+def _refresh_patient_snapshot_in_background():
+    """Refresh the snapshot unless another refresh is already running"""
+    if not _patient_snapshot_lock.acquire(blocking=False):
+        return
+    try:
+        _refresh_patient_snapshot_locked()
+    except Exception:
+        logger.exception("Background refresh of the patient snapshot failed")
+    finally:
+        _patient_snapshot_lock.release()
+
+def get_patient_snapshot() -> pd.DataFrame:
+    """
+    Return the cached patient snapshot, loading it on first use
+
+    Once the snapshot is older than PATIENT_SNAPSHOT_TTL_SECONDS a refresh is
+    started in the background and the current snapshot is served meanwhile.
+    """
+    if _patient_snapshot is None:
+        refresh_patient_snapshot()
+    elif time.monotonic() - _patient_snapshot_loaded_at > PATIENT_SNAPSHOT_TTL_SECONDS:
+        threading.Thread(target=_refresh_patient_snapshot_in_background, daemon=True).start()
+    return _patient_snapshot
+
+def get_patient_search_index() -> Dict[str, Any]:
+    """Return the /vector-search index built from the current patient snapshot"""
+    get_patient_snapshot()
+    return _patient_search_index
+
+# Query planning for /vector-search: words that carry no search signal on their own
+SEARCH_FILLER_WORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "and", "or", "with", "by", "from", "about",
+    "me", "my", "i", "is", "are", "was", "were", "has", "have", "had", "who", "what", "which", "whose",
+    "show", "get", "find", "give", "list", "search", "fetch", "display", "tell", "all", "any",
+    "details", "detail", "info", "information", "record", "records", "history", "case",
+    "medical", "medicine", "medicines", "medication", "medications", "prescription", "prescriptions",
+    "prescribed", "remedy", "remedies", "potency", "potencies", "taking", "took", "given",
+    "patient", "patients", "pid", "mr", "mrs", "ms", "dr",
+    "named", "name", "called", "his", "her", "their", "this", "that", "please", "family",
+    "visit", "visits", "visited", "since", "year", "years",
+}
+# Known misspellings of filler words seen in practitioner queries (e.g. the notebook's "pricption")
+SEARCH_FILLER_MISSPELLINGS = {
+    "pricption", "priscription", "perscription", "prescripton", "presciption", "prescrption", "precription",
+    "medicene", "medecine", "medcine", "medicin", "medicals", "detials", "deatils", "histroy", "patiant", "pateint",
+}
+SEARCH_NAME_MATCH_CUTOFF = 0.85
+# Fuzzy name candidates share the token's first letter and are at most this many characters longer/shorter
+SEARCH_NAME_LENGTH_TOLERANCE = 2
+SEARCH_STRATEGY_WEIGHTS = {"name_match": 1.0, "remedy_match": 1.0, "vector_search": 1.0}
+
+# Full remedy name words (e.g. "arnica", "natrum") mapped to their prescription abbreviations
+REMEDY_NAME_WORDS: Dict[str, List[str]] = {}
+for _abbreviation, _remedy_name in REMEDY_ABBREVIATIONS.items():
+    REMEDY_NAME_WORDS.setdefault(_remedy_name.split()[0].lower(), []).append(_abbreviation)
+
+def build_patient_search_index(snapshot: pd.DataFrame) -> Dict[str, Any]:
+    """Lowercased name/prescription columns and fuzzy name buckets, built once per snapshot load"""
+    first_names = snapshot["FirstName"].fillna("").astype(str).str.lower()
+    last_names = snapshot["LastName"].fillna("").astype(str).str.lower()
+    names = (set(first_names) | set(last_names)) - {""}
+
+    name_buckets: Dict[tuple, List[str]] = {}
+    for name in names:
+        name_buckets.setdefault((name[0], len(name)), []).append(name)
+
+    return {
+        "first_names": first_names,
+        "last_names": last_names,
+        "prescriptions": snapshot["Prescriptions"].fillna("").astype(str).str.lower(),
+        "names": names,
+        "name_buckets": name_buckets,
+    }
+
+def match_patient_names(token: str, search_index: Dict[str, Any]) -> List[str]:
+    """Patient names equal to the token, or close misspellings of it from the same bucket"""
+    if token in search_index["names"]:
+        return [token]
+
+    candidates = [
+        name
+        for length in range(len(token) - SEARCH_NAME_LENGTH_TOLERANCE, len(token) + SEARCH_NAME_LENGTH_TOLERANCE + 1)
+        for name in search_index["name_buckets"].get((token[0], length), [])
+    ]
+    return difflib.get_close_matches(token, candidates, n=3, cutoff=SEARCH_NAME_MATCH_CUTOFF)
+
+def plan_patient_query(question: str, search_index: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Classify a (non-PID) search query and choose the cheapest strategies that can answer it
+
+    Tokens are matched, in order, against filler words (and their known misspellings),
+    remedy abbreviations/names (with an optional potency), and the patient name index
+    (exact, then fuzzy). Anything left is treated as free text and requires a
+    semantic vector search.
+    """
+    # Drop possessives ("Shobha's"), single characters and years, which carry no symptom signal
+    question = re.sub(r"['’]s\b", "", question.lower())
+    tokens = [
+        token for token in re.findall(r"[a-z]+|\d+[a-z]*", question)
+        if len(token) > 1 and not re.fullmatch(r"(?:19|20)\d{2}", token)
+    ]
+
+    name_terms: Dict[str, List[str]] = {}
+    remedy_terms: List[Dict[str, Any]] = []
+    free_text: List[str] = []
+    potency_positions = set()
+
+    for position, token in enumerate(tokens):
+        if position in potency_positions or token in SEARCH_FILLER_WORDS or token in SEARCH_FILLER_MISSPELLINGS:
+            continue
+
+        abbreviations = [token] if token in REMEDY_ABBREVIATIONS else REMEDY_NAME_WORDS.get(token)
+        if abbreviations:
+            following = tokens[position + 1] if position + 1 < len(tokens) else ""
+            potency = following if re.fullmatch(r"\d+[xcm]?", following) else None
+            if potency:
+                potency_positions.add(position + 1)
+            remedy_terms.append({"term": token, "abbreviations": abbreviations, "potency": potency})
+            continue
+
+        if token.isalpha() and len(token) > 2:
+            names = match_patient_names(token, search_index)
+            if names:
+                name_terms[token] = names
+                continue
+
+        free_text.append(token)
+
+    strategies = []
+    if name_terms:
+        strategies.append("name_match")
+    if remedy_terms:
+        strategies.append("remedy_match")
+    if free_text or not strategies:
+        strategies.append("vector_search")
+
+    return {
+        "strategies": strategies,
+        "name_terms": name_terms,
+        "remedy_terms": remedy_terms,
+        "free_text": free_text,
+    }
+
+def score_name_match(search_index: Dict[str, Any], name_terms: Dict[str, List[str]]) -> pd.Series:
+    """Fraction of the query's name terms matched by each patient's first or last name"""
+    first_names = search_index["first_names"]
+    last_names = search_index["last_names"]
+
+    hits = [first_names.isin(names) | last_names.isin(names) for names in name_terms.values()]
+    return pd.concat(hits, axis=1).mean(axis=1)
+
+def score_remedy_match(search_index: Dict[str, Any], remedy_terms: List[Dict[str, Any]]) -> pd.Series:
+    """Fraction of the query's remedy (and potency) terms present in each patient's prescriptions"""
+    prescriptions = search_index["prescriptions"]
+
+    hits = []
+    for term in remedy_terms:
+        pattern = r"(?<![a-z])(?:" + "|".join(term["abbreviations"]) + r")(?![a-z])"
+        if term["potency"]:
+            pattern += r"\s*" + re.escape(term["potency"]) + r"(?![\w/:.])"
+        hits.append(prescriptions.str.contains(pattern, regex=True))
+
+    return pd.concat(hits, axis=1).mean(axis=1)
+
+def semantic_search_distances(question: str, top_k: int) -> pd.Series:
+    """Cosine distances of the top_k nearest patients to the question, indexed by PID"""
+    # Generate embedding for the search string
+    text_model = TextEmbeddingGenerator(model_name="text-multilingual-embedding-002")
+    search_df = bpd.DataFrame([question], columns=['search_string'])
+    search_embedding = text_model.predict(search_df)
+
+    # Perform vector search using bigframes
+    vector_search_results = bbq.vector_search(
+        base_table=EMBEDDING_TABLE_ID,
+        column_to_search="ml_generate_embedding_result",
+        query=search_embedding,
+        distance_type="COSINE",
+        query_column_to_search="ml_generate_embedding_result",
+        top_k=top_k,
+    )
+
+    results_pd = vector_search_results[["PID", "distance"]].to_pandas()
+    return results_pd.groupby("PID")["distance"].min().astype(float)
+
+def format_search_result(pid: int, patient: pd.Series, similarity: float) -> Dict[str, Any]:
+    """Format a patient row as a /vector-search result"""
+    return {
+        "pid": int(pid),
+        "first_name": patient['FirstName'],
+        "last_name": patient['LastName'],
+        "age": int(patient['Age']),
+        "gender": patient['Gender'],
+        "address": patient['Address'],
+        "first_visit": patient['FirstVisit'],
+        "prescriptions": patient['Prescriptions'],
+        "similarity": similarity
+    }
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -436,7 +1022,9 @@ async def root():
             "/patients": "GET - Get patients with pagination (limit, offset params)",
         "/patients/count": "GET - Get total patient count",
             "/patients/{pid}": "GET - Get specific patient by PID",
-            "/search": "GET - Search patients by query"
+            "/search": "GET - Search patients by query",
+            "/analytics": "GET - Precomputed practice analytics (remedies by age band, gender split, new patients per month, potencies)",
+            "/analytics/refresh": "POST - Reload patients and incrementally update analytics"
         }
     }
 
@@ -513,14 +1101,17 @@ async def analyze_patient(request: PIDAnalysisRequest):
 @app.post("/vector-search")
 async def vector_search(request: VectorSearchRequest):
     """
-    Perform semantic vector search on patient data
+    Perform planned search on patient data
     
-    Takes a natural language query and finds similar patients using vector embeddings.
-    Also supports direct PID lookups (e.g., "patient 123" or "PID 456").
+    Takes a natural language query, classifies it and runs the cheapest matching strategy:
+    direct PID lookups (e.g., "patient 123" or "PID 456"), patient name matches,
+    remedy/potency matches (e.g., "arnica 30") or semantic vector search for free text.
     
     Returns JSON format with:
-    - search_type: "vector_search" or "pid_lookup"
+    - search_type: "pid_lookup", or the "+"-joined strategies used
+      ("name_match", "remedy_match", "vector_search")
     - query: Original search query
+    - query_plan: Name, remedy and free-text terms the query was classified into
     - results: List of matching patients with similarity scores
     - total_results: Number of results found
     """
@@ -701,6 +1292,62 @@ async def search_patients_endpoint(q: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to search patients: {str(e)}")
 
+@app.get("/analytics")
+async def get_analytics():
+    """
+    Get precomputed practice-level analytics
+
+    Aggregates are materialized from the patient snapshot and only recomputed
+    for rows that changed. Once they are older than PATIENT_SNAPSHOT_TTL_SECONDS
+    a background refresh is started (or use POST /analytics/refresh).
+
+    Returns JSON object with:
+    - refreshed_at: When the aggregates were last brought up to date
+    - data_age_seconds: Seconds since refreshed_at
+    - total_patients, total_visits: Practice totals
+    - gender_split, age_bands: Patient demographics
+    - new_patients_per_month: New patients by FirstVisit month (YYYY-MM)
+    - remedy_frequency, remedy_by_age_band: Remedy mentions across all visits
+    - potency_frequency: Most common potencies written next to remedies
+    """
+    try:
+        get_patient_snapshot()
+        analytics = dict(patient_analytics.materialized)
+        data_age = (datetime.now() - patient_analytics.refreshed_at).total_seconds()
+
+        return JSONResponse(content={
+            "refreshed_at": analytics.pop("refreshed_at"),
+            "data_age_seconds": round(data_age, 1),
+            **analytics
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
+
+@app.post("/analytics/refresh")
+async def refresh_analytics():
+    """
+    Reload the patient snapshot and incrementally update the analytics
+
+    Only rows whose fingerprint changed are downloaded and re-aggregated.
+
+    Returns JSON object with the number of added, modified and removed patients
+    """
+    try:
+        changes = refresh_patient_snapshot()
+        return JSONResponse(content={
+            "status": "success",
+            "changes": changes,
+            "refreshed_at": patient_analytics.materialized["refreshed_at"]
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to refresh analytics: {str(e)}")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -15,6 +15,23 @@ interface ChatMessage {
   timestamp: Date;
 }
 
+// Labels for the strategies the backend joins with "+" in search_type
+const SEARCH_STRATEGY_LABELS: Record<string, string> = {
+  pid_lookup: 'Direct Patient Lookup',
+  name_match: 'Patient Name Match',
+  remedy_match: 'Remedy/Potency Match',
+  vector_search: 'Semantic Vector Search',
+};
+
+// Function to describe a search_type such as "name_match+vector_search"
+const formatSearchType = (searchType: string) => {
+  if (!searchType) return 'Unknown';
+  return searchType
+    .split('+')
+    .map((strategy) => SEARCH_STRATEGY_LABELS[strategy] ?? strategy)
+    .join(' + ');
+};
+
 // Function to format AI search results
 const formatSearchResults = (results: any) => {
   if (!results) return "No results found.";
@@ -30,7 +47,7 @@ const formatSearchResults = (results: any) => {
   
   let formatted = `**AI Search Results**\n\n`;
   formatted += `**Query:** "${query}"\n`;
-  formatted += `**Search Type:** ${search_type === 'vector_search' ? 'Semantic Vector Search' : 'Direct Patient Lookup'}\n`;
+  formatted += `**Search Type:** ${formatSearchType(search_type)}\n`;
   formatted += `**Total Results:** ${total_results}\n\n`;
   
   if (patients && patients.length > 0) {
@@ -58,10 +75,12 @@ const formatSearchResults = (results: any) => {
     
     formatted += `\n**Analysis Summary:**\n`;
     formatted += `Found ${total_results} patients matching your search criteria. `;
-    if (search_type === 'vector_search') {
+    if (search_type === 'pid_lookup') {
+      formatted += `This was a direct patient lookup.`;
+    } else if (search_type === 'vector_search') {
       formatted += `The results are ranked by semantic similarity to your query.`;
     } else {
-      formatted += `This was a direct patient lookup.`;
+      formatted += `The results are ranked by how well they match your query (${formatSearchType(search_type)}).`;
     }
   }
   
@@ -300,7 +319,7 @@ export function AISearchModal({ open, searchQuery, searchResults, onClose }: Pro
                   <div className="bg-white rounded-lg p-4 border border-gray-200 shadow-sm">
                     <div className="text-xs font-mono text-gray-500 mb-2">SEARCH TYPE</div>
                     <div className="text-sm font-mono text-gray-900">
-                      {searchResults.search_type === 'vector_search' ? 'AI Semantic Search' : 'Direct Lookup'}
+                      {formatSearchType(searchResults.search_type)}
                     </div>
                   </div>
                 </div>
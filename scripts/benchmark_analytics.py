@@ -0,0 +1,101 @@
+"""
+Benchmark for the precomputed /analytics endpoint
+
+Builds synthetic patient snapshots of increasing size and times:
+- the initial full aggregation
+- an incremental refresh after a few rows change
+- a GET /analytics read of the materialized result (should stay flat as patients grow)
+
+Run from the repository root with the packages from requirements.txt installed:
+    python scripts/benchmark_analytics.py --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# main.py requires these at import time; the benchmark never calls Google APIs
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("PROJECT_ID", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+FIRST_NAMES = ["Shanti", "Mohan", "Meera", "Radha", "Arjun", "Lata", "Shobha", "Deepika"]
+LAST_NAMES = ["Mehta", "Nair", "Aggarwal", "Bhardwaj", "Jain", "Rao"]
+COMPLAINTS = ["skin rash", "c/o constipation", "dry cough", "knee pain", "headache", "T3, T4 TSH nad"]
+POTENCIES = ["30", "200", "6x", "200c", "1m", ""]
+
+def add_row_hashes(snapshot: pd.DataFrame) -> pd.DataFrame:
+    """Stand-in for the FARM_FINGERPRINT row_hash computed by BigQuery"""
+    snapshot["row_hash"] = pd.util.hash_pandas_object(snapshot[main.PATIENT_SNAPSHOT_COLUMNS[1:]], index=False).values
+    return snapshot
+
+def synthetic_snapshot(size: int, seed: int = 0) -> pd.DataFrame:
+    """Random patients shaped like the patients table, indexed by PID"""
+    rng = np.random.default_rng(seed)
+    remedies = list(main.REMEDY_ABBREVIATIONS)
+
+    def visit() -> str:
+        date = f"{rng.integers(1, 13):02d}/{rng.integers(1, 29):02d}/{rng.integers(10, 26):02d} 00:00:00"
+        prescribed = " ".join(f"{rng.choice(remedies)} {rng.choice(POTENCIES)}" for _ in range(rng.integers(1, 4)))
+        return f"{date} - {rng.choice(COMPLAINTS)} // 40 size {prescribed} // 15 days {rng.integers(100, 500)}"
+
+    snapshot = pd.DataFrame({
+        "PID": np.arange(1, size + 1),
+        "FirstName": rng.choice(FIRST_NAMES, size),
+        "LastName": rng.choice(LAST_NAMES, size),
+        "Age": rng.integers(1, 81, size),
+        "Gender": rng.choice(["M", "F"], size),
+        "Address": [f"{number}, Temple Road, Mumbai" for number in rng.integers(1, 999, size)],
+        "FirstVisit": [
+            f"{month:02d}/{day:02d}/{year:02d} 10:00:00"
+            for month, day, year in zip(rng.integers(1, 13, size), rng.integers(1, 29, size), rng.integers(5, 26, size))
+        ],
+        "Prescriptions": [
+            f" {main.VISIT_SEPARATOR} ".join(visit() for _ in range(visits)) for visits in rng.integers(1, 8, size)
+        ],
+    }).set_index("PID")
+    return add_row_hashes(snapshot)
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def benchmark(size: int, changed_rows: int, reads: int):
+    snapshot = synthetic_snapshot(size)
+    store = main.PatientAnalyticsStore()
+    full_seconds = timed(lambda: store.refresh(snapshot))
+
+    updated = snapshot.copy()
+    pids = updated.index[:changed_rows]
+    updated.loc[pids, "Prescriptions"] += f" {main.VISIT_SEPARATOR} 01/01/26 00:00:00 - arn 200"
+    updated = add_row_hashes(updated)
+    incremental_seconds = timed(lambda: store.refresh(updated))
+
+    # Serve GET /analytics from this store without triggering a snapshot refresh
+    main.patient_analytics = store
+    main._patient_snapshot = updated
+    main._patient_snapshot_loaded_at = time.monotonic()
+    read_times = [timed(lambda: asyncio.run(main.get_analytics())) for _ in range(reads)]
+
+    print(
+        f"{size:>9,} patients | full build {full_seconds * 1000:9.1f} ms"
+        f" | refresh {changed_rows} changed {incremental_seconds * 1000:8.1f} ms"
+        f" | GET /analytics median {np.median(read_times) * 1000:6.2f} ms"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the precomputed /analytics endpoint")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--changed-rows", type=int, default=10)
+    parser.add_argument("--reads", type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        benchmark(size, args.changed_rows, args.reads)